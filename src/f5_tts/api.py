@@ -9,6 +9,7 @@ from hydra.utils import get_class
 from omegaconf import OmegaConf
 
 from f5_tts.infer.utils_infer import (
+    infer_multi_process,
     infer_process,
     load_model,
     load_vocoder,
@@ -31,6 +32,7 @@ class F5TTS:
         vocoder_local_path=None,
         device=None,
         hf_cache_dir=None,
+        dtype=None,
     ):
         model_cfg = OmegaConf.load(str(files("f5_tts").joinpath(f"configs/{model}.yaml")))
         model_cls = get_class(f"f5_tts.model.{model_cfg.model.backbone}")
@@ -80,7 +82,15 @@ class F5TTS:
                 cached_path(f"hf://SWivid/{repo_name}/{model}/model_{ckpt_step}.{ckpt_type}", cache_dir=hf_cache_dir)
             )
         self.ema_model = load_model(
-            model_cls, model_arc, ckpt_file, self.mel_spec_type, vocab_file, self.ode_method, self.use_ema, self.device
+            model_cls,
+            model_arc,
+            ckpt_file,
+            self.mel_spec_type,
+            vocab_file,
+            self.ode_method,
+            self.use_ema,
+            self.device,
+            dtype=dtype,
         )
 
     def transcribe(self, ref_audio, language=None):
@@ -148,6 +158,46 @@ class F5TTS:
 
         return wav, sr, spec
 
+    def infer_batch(
+        self,
+        requests,
+        show_info=print,
+        target_rms=0.1,
+        cross_fade_duration=0.15,
+        sway_sampling_coef=-1,
+        cfg_strength=2,
+        nfe_step=32,
+        speed=1.0,
+        seed=None,
+        max_batch_samples=None,
+    ):
+        # requests: list of (ref_file, ref_text, gen_text), returns a list of (wav, sr, spec) in the same order
+        if seed is None:
+            seed = random.randint(0, sys.maxsize)
+        seed_everything(seed)
+        self.seed = seed
+
+        requests = [
+            (*preprocess_ref_audio_text(ref_file, ref_text, show_info=show_info), gen_text)
+            for ref_file, ref_text, gen_text in requests
+        ]
+
+        return infer_multi_process(
+            requests,
+            self.ema_model,
+            self.vocoder,
+            self.mel_spec_type,
+            show_info=show_info,
+            target_rms=target_rms,
+            cross_fade_duration=cross_fade_duration,
+            nfe_step=nfe_step,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+            speed=speed,
+            device=self.device,
+            max_batch_samples=max_batch_samples,
+        )
+
 
 if __name__ == "__main__":
     f5tts = F5TTS()
@@ -1,10 +1,21 @@
+import argparse
+import asyncio
+import atexit
 import base64
+import functools
+import importlib.metadata
 import io
+import logging
 import os
+import queue
+import re
 import sys
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 # 添加src目录到Python路径
 current_dir = Path(__file__).parent.absolute()
@@ -12,110 +23,335 @@ src_dir = current_dir.parent.parent / "src"
 if str(src_dir) not in sys.path:
     sys.path.insert(0, str(src_dir))
 
+def _torch_supports_expandable_segments():
+    """不导入torch，根据已安装版本判断是否支持expandable_segments（PyTorch 2.1+）"""
+    try:
+        version = importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    match = re.match(r"(\d+)\.(\d+)", version)
+    return match is not None and tuple(int(x) for x in match.groups()) >= (2, 1)
+
+# 须在导入torch之前配置CUDA显存分配器：可扩展段能减少变长推理造成的显存碎片；
+# 旧版本PyTorch不认识该选项，会在首次分配显存时报错，因此仅在支持时设置
+if _torch_supports_expandable_segments():
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:512")
+
 import soundfile as sf
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 
+# 安装了orjson时使用更快的ORJSONResponse序列化JSON响应
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
 # 延迟导入F5TTS
 F5TTS = None
 
+# 日志先写入队列，由后台线程输出，避免在事件循环线程中执行阻塞的I/O
+logger = logging.getLogger("f5_tts.fastapi_server")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_handler)
+logger.addHandler(QueueHandler(_log_queue))
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 # 默认模型配置
 DEFAULT_MODEL = "F5TTS_v1_Base"
 DEFAULT_CKPT_FILE = "models/F5-TTS/F5TTS_v1_Base/model_1250000.safetensors"
 DEFAULT_VOCAB_FILE = "models/F5-TTS/F5TTS_v1_Base/vocab.txt"
 
-# 全局变量存储模型实例
-f5tts_instance = None
-current_model = None
-current_ckpt_file = None
-model_loaded = False
+# 模型推理精度：auto（CUDA上自动使用fp16）/ fp32 / fp16 / bf16
+PRECISION_CHOICES = ("auto", "fp32", "fp16", "bf16")
+PRECISION = os.environ.get("F5TTS_PRECISION", "auto")
+
+# torch.compile编译模式：none（不编译）/ default / reduce-overhead / max-autotune
+COMPILE_MODE_CHOICES = ("none", "default", "reduce-overhead", "max-autotune")
+COMPILE_MODE = os.environ.get("F5TTS_COMPILE_MODE", "none")
+
+# 预热用的内置参考音频
+WARMUP_REF_FILE = str(current_dir / "infer" / "examples" / "basic" / "basic_ref_en.wav")
+WARMUP_REF_TEXT = "some call me nature, others call me mother nature."
+WARMUP_GEN_TEXT = "Hello world."
+
+# 微批处理配置：单批最多合并的请求数，以及凑批时等待后续请求的时间（秒）
+MAX_BATCH_SIZE = int(os.environ.get("F5TTS_MAX_BATCH_SIZE", "4"))
+BATCH_WAIT_SECONDS = 0.005
+# 长文本会被切成多个样本，单次采样最多并行的样本数，超出部分顺延到下一次采样，避免显存随文本长度失控
+MAX_BATCH_SAMPLES = int(os.environ.get("F5TTS_MAX_BATCH_SAMPLES", "8"))
+
+@dataclass
+class AppState:
+    """服务运行状态，集中存放模型实例及其加载信息"""
+    f5tts_instance: Any = None
+    current_model: Optional[str] = None
+    current_ckpt_file: Optional[str] = None
+    model_loaded: bool = False
+
+@dataclass
+class PendingRequest:
+    """等待批处理的推理请求"""
+    future: asyncio.Future
+    ref_file: Any
+    ref_text: str
+    gen_text: str
+
+# 全局状态实例
+state = AppState()
+
+# 推理专用线程池：GPU本身是串行资源，单线程即可，避免阻塞事件循环
+EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+# 模型加载锁，防止并发请求重复加载模型
+_load_lock = asyncio.Lock()
+
+# 待推理请求队列，由 _batcher_loop 统一消费
+_request_queue = asyncio.Queue()
 
 def lazy_import_f5tts():
     """延迟导入F5TTS模块"""
     global F5TTS
     if F5TTS is None:
         try:
-            print("📦 正在导入F5TTS模块...")
+            logger.info("📦 正在导入F5TTS模块...")
             from f5_tts.api import F5TTS
-            print("✅ F5TTS模块导入成功")
+            logger.info("✅ F5TTS模块导入成功")
         except Exception as e:
-            print(f"❌ F5TTS模块导入失败: {e}")
+            logger.error(f"❌ F5TTS模块导入失败: {e}")
             raise e
     return F5TTS
 
-def get_f5tts_instance(model: str, ckpt_file: str = "", vocab_file: str = ""):
-    """获取或创建F5TTS实例"""
-    global f5tts_instance, current_model, current_ckpt_file, model_loaded
+def _resolve_dtype(precision: str):
+    """将精度名称转换为torch数据类型，auto返回None交由加载逻辑按设备选择"""
+    if precision not in PRECISION_CHOICES:
+        raise ValueError(f"不支持的推理精度: {precision}，可选: {', '.join(PRECISION_CHOICES)}")
+    if precision == "auto":
+        return None
+    
+    import torch
+    return {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}[precision]
+
+def _resolve_compile_mode(compile_mode: str):
+    """校验torch.compile编译模式，环境变量传入的取值不经过argparse校验"""
+    if compile_mode not in COMPILE_MODE_CHOICES:
+        raise ValueError(f"不支持的编译模式: {compile_mode}，可选: {', '.join(COMPILE_MODE_CHOICES)}")
+    return compile_mode
+
+def _check_batch_limit(name: str, value: int):
+    """校验批处理上限，环境变量和命令行传入的取值只做了int转换，未检查范围"""
+    if value < 1:
+        raise ValueError(f"{name} 必须为正整数，当前为: {value}")
+    return value
+
+def _compile_model(tts, compile_mode: str):
+    """使用torch.compile编译DiT的各个Transformer块（阻塞调用）
+    
+    只编译无状态的Transformer块，而不是整个backbone：backbone在采样过程中会缓存文本嵌入，
+    与reduce-overhead模式下的CUDA Graph输出复用不兼容
+    """
+    import torch
+    
+    blocks = getattr(tts.ema_model.transformer, "transformer_blocks", None)
+    if blocks is None:
+        logger.warning(f"⚠️  当前模型结构不支持编译，跳过: {type(tts.ema_model.transformer).__name__}")
+        return
     
-    if (f5tts_instance is None or 
-        current_model != model or 
-        current_ckpt_file != ckpt_file):
+    logger.info(f"⚙️ 正在编译模型，模式: {compile_mode}")
+    for i, block in enumerate(blocks):
+        blocks[i] = torch.compile(block, mode=compile_mode, dynamic=True)
+
+def _warmup_model(tts, strict: bool = False):
+    """使用内置参考音频推理一次，提前承担cuBLAS/cuDNN初始化、显存分配及编译等一次性开销（阻塞调用）
+    
+    走与线上请求相同的批处理推理路径；未编译的模型预热失败不影响加载，
+    strict为True时（模型已编译）重新抛出异常，避免发布编译失败、无法推理的模型
+    """
+    logger.info("🔥 正在预热模型...")
+    try:
+        tts.infer_batch(
+            [(WARMUP_REF_FILE, WARMUP_REF_TEXT, WARMUP_GEN_TEXT)],
+            show_info=logger.info
+        )
+        logger.info("✅ 模型预热完成")
+    except Exception as e:
+        if strict:
+            logger.error(f"❌ 编译后的模型预热失败: {e}")
+            raise
+        logger.warning(f"⚠️  模型预热失败，首个请求可能较慢: {e}")
+    finally:
+        # 释放预热过程中缓存的临时显存
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+# 参考音频支持的格式，用于拒绝上传时提示客户端
+SUPPORTED_AUDIO_FORMATS = "WAV, OGG, FLAC, MP3, AAC, M4A, WebM/Matroska, AIFF"
+
+def _is_audio_header(header: bytes) -> bool:
+    """根据文件头（魔数）判断是否为支持的音频格式，见 SUPPORTED_AUDIO_FORMATS"""
+    if header.startswith(b"RIFF"):
+        return header[8:12] == b"WAVE"
+    if header.startswith(b"FORM"):
+        return header[8:12] in (b"AIFF", b"AIFC")
+    # 浏览器MediaRecorder录制的WebM与Matroska共用EBML文件头
+    if header.startswith((b"OggS", b"fLaC", b"ID3", b"\x1a\x45\xdf\xa3")):
+        return True
+    if header[4:8] == b"ftyp":  # MP4/M4A容器
+        return True
+    # MPEG音频帧同步字（MP3、ADTS AAC）
+    return len(header) >= 2 and header[0] == 0xFF and (header[1] & 0xE0) == 0xE0
+
+def _needs_load(model: str, ckpt_file: str):
+    """判断是否需要(重新)加载模型"""
+    return (state.f5tts_instance is None or 
+            state.current_model != model or 
+            state.current_ckpt_file != ckpt_file)
+
+def _load_f5tts(model: str, ckpt_file: str, vocab_file: str):
+    """加载F5TTS实例（阻塞调用，需在线程池中执行）"""
+    try:
+        # 延迟导入F5TTS
+        F5TTS_class = lazy_import_f5tts()
         
-        try:
-            # 延迟导入F5TTS
-            F5TTS_class = lazy_import_f5tts()
-            
-            print(f"🔄 正在加载模型: {model}")
-            print(f"📁 模型文件: {ckpt_file}")
-            print(f"📝 词汇表: {vocab_file}")
-            
-            f5tts_instance = F5TTS_class(
-                model=model,
-                ckpt_file=ckpt_file,
-                vocab_file=vocab_file
-            )
-            current_model = model
-            current_ckpt_file = ckpt_file
-            model_loaded = True
-            
-            print(f"✅ 模型加载成功: {model}")
-            print(f"📍 模型路径: {ckpt_file}")
-        except Exception as e:
-            model_loaded = False
-            print(f"❌ 模型加载失败: {e}")
-            raise HTTPException(status_code=500, detail=f"模型加载失败: {str(e)}")
+        logger.info(f"🔄 正在加载模型: {model}")
+        logger.info(f"📁 模型文件: {ckpt_file}")
+        logger.info(f"📝 词汇表: {vocab_file}")
+        logger.info(f"🎚️ 推理精度: {PRECISION}")
+        
+        dtype = _resolve_dtype(PRECISION)
+        compile_mode = _resolve_compile_mode(COMPILE_MODE)
+        tts = F5TTS_class(
+            model=model,
+            ckpt_file=ckpt_file,
+            vocab_file=vocab_file,
+            dtype=dtype
+        )
+        if compile_mode != "none":
+            _compile_model(tts, compile_mode)
+        _warmup_model(tts, strict=compile_mode != "none")
+        
+        state.f5tts_instance = tts
+        state.current_model = model
+        state.current_ckpt_file = ckpt_file
+        state.model_loaded = True
+        
+        logger.info(f"✅ 模型加载成功: {model}")
+        logger.info(f"📍 模型路径: {ckpt_file}")
+    except Exception as e:
+        state.model_loaded = False
+        logger.error(f"❌ 模型加载失败: {e}")
+        raise HTTPException(status_code=500, detail=f"模型加载失败: {str(e)}")
+
+async def get_f5tts_instance(model: str, ckpt_file: str = "", vocab_file: str = ""):
+    """获取或创建F5TTS实例，并发请求下通过锁保证模型只加载一次"""
+    if _needs_load(model, ckpt_file):
+        async with _load_lock:
+            # 双重检查：等待锁期间模型可能已被其他请求加载
+            if _needs_load(model, ckpt_file):
+                await asyncio.get_running_loop().run_in_executor(
+                    EXECUTOR,
+                    functools.partial(_load_f5tts, model, ckpt_file, vocab_file)
+                )
     
-    return f5tts_instance
+    return state.f5tts_instance
 
-def preload_model():
+async def preload_model():
     """预加载默认模型（可选）"""
     try:
-        print("🚀 开始预加载F5-TTS模型...")
-        get_f5tts_instance(DEFAULT_MODEL, DEFAULT_CKPT_FILE, DEFAULT_VOCAB_FILE)
-        print("🎉 模型预加载完成！")
+        logger.info("🚀 开始预加载F5-TTS模型...")
+        await get_f5tts_instance(DEFAULT_MODEL, DEFAULT_CKPT_FILE, DEFAULT_VOCAB_FILE)
+        logger.info("🎉 模型预加载完成！")
+    except Exception as e:
+        logger.warning(f"⚠️  模型预加载失败: {e}")
+        logger.info("💡 将在首次请求时尝试加载模型")
+
+def _run_batch(batch: list):
+    """对一批请求执行推理（阻塞调用，需在线程池中执行）"""
+    for req in batch:
+        req.ref_file.seek(0)
+    return state.f5tts_instance.infer_batch(
+        [(req.ref_file, req.ref_text, req.gen_text) for req in batch],
+        show_info=logger.info,
+        max_batch_samples=MAX_BATCH_SAMPLES
+    )
+
+async def _process_batch(batch: list):
+    """执行一批推理，并将结果或异常交给各请求的future"""
+    try:
+        results = await asyncio.get_running_loop().run_in_executor(EXECUTOR, _run_batch, batch)
     except Exception as e:
-        print(f"⚠️  模型预加载失败: {e}")
-        print("💡 将在首次请求时尝试加载模型")
+        if len(batch) == 1:
+            if not batch[0].future.done():
+                batch[0].future.set_exception(e)
+            return
+        # 批量推理失败时逐个重试，避免单个异常请求拖累同批的其他请求；跳过已取消的请求
+        logger.warning(f"⚠️  批量推理失败，改为逐个推理: {e}")
+        for req in batch:
+            if not req.future.done():
+                await _process_batch([req])
+        return
+    
+    for req, result in zip(batch, results):
+        if not req.future.done():
+            req.future.set_result(result)
+
+async def _batcher_loop():
+    """从队列中收集同时到达的请求，合并为一批进行推理"""
+    while True:
+        batch = [await _request_queue.get()]
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                batch.append(await asyncio.wait_for(_request_queue.get(), timeout=BATCH_WAIT_SECONDS))
+            except asyncio.TimeoutError:
+                break
+        
+        # 跳过已取消的请求（例如客户端已断开连接）
+        batch = [req for req in batch if not req.future.done()]
+        if batch:
+            await _process_batch(batch)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时预加载模型，使首个请求无需承担模型加载的开销"""
+    logger.info("🌟 F5-TTS API 服务启动中...")
+    # 批处理配置有误时直接启动失败，而不是等到请求推理时才出错
+    _check_batch_limit("F5TTS_MAX_BATCH_SIZE", MAX_BATCH_SIZE)
+    _check_batch_limit("F5TTS_MAX_BATCH_SAMPLES", MAX_BATCH_SAMPLES)
+    await preload_model()
+    batcher_task = asyncio.create_task(_batcher_loop())
+    yield
+    batcher_task.cancel()
 
 # 创建FastAPI应用
 app = FastAPI(
     title="F5-TTS API",
     description="F5-TTS 文本转语音 API 服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=DefaultResponse
 )
 
-# 可选的启动事件，用于预加载模型
-# 注释掉以避免启动时卡住
-# @app.on_event("startup")
-# async def startup_event():
-#     """启动时的事件处理"""
-#     print("🌟 F5-TTS API 服务启动中...")
-#     preload_model()
-
+# 注意：所有路由均保持 async def，且不做阻塞操作；
+# 同步路由会被FastAPI放入线程池执行，在推理繁忙时会拖慢健康检查等轻量接口
 @app.get("/")
 async def root():
     """根路径，返回API信息"""
-    global model_loaded, current_model, current_ckpt_file
-    
     return {
         "message": "F5-TTS API 服务正在运行",
         "version": "1.0.0",
         "model": {
-            "name": current_model or DEFAULT_MODEL,
-            "path": current_ckpt_file or DEFAULT_CKPT_FILE,
-            "loaded": model_loaded,
-            "status": "已加载" if model_loaded else "未加载"
+            "name": state.current_model or DEFAULT_MODEL,
+            "path": state.current_ckpt_file or DEFAULT_CKPT_FILE,
+            "loaded": state.model_loaded,
+            "status": "已加载" if state.model_loaded else "未加载"
         },
         "endpoints": {
             "POST /tts-simple": "简化版文本转语音（使用默认参数）",
@@ -129,11 +365,11 @@ async def root():
 async def preload_endpoint():
     """手动预加载模型的端点"""
     try:
-        preload_model()
+        await preload_model()
         return {
             "message": "模型预加载成功",
-            "model_loaded": model_loaded,
-            "model": current_model
+            "model_loaded": state.model_loaded,
+            "model": state.current_model
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"模型预加载失败: {str(e)}")
@@ -141,25 +377,22 @@ async def preload_endpoint():
 @app.get("/health")
 async def health_check():
     """健康检查"""
-    global model_loaded
     return {
-        "status": "healthy" if model_loaded else "degraded",
-        "message": "F5-TTS API 服务正常运行" if model_loaded else "服务运行中，但模型未加载",
-        "model_loaded": model_loaded
+        "status": "healthy" if state.model_loaded else "degraded",
+        "message": "F5-TTS API 服务正常运行" if state.model_loaded else "服务运行中，但模型未加载",
+        "model_loaded": state.model_loaded
     }
 
 @app.get("/models")
 async def get_models():
     """获取支持的模型列表"""
-    global model_loaded, current_model
-    
     models = [
         {
             "name": "F5TTS_v1_Base",
             "description": "F5-TTS v1 Base模型",
             "ckpt_path": DEFAULT_CKPT_FILE,
             "vocab_path": DEFAULT_VOCAB_FILE,
-            "status": "已加载" if (model_loaded and current_model == "F5TTS_v1_Base") else "可用",
+            "status": "已加载" if (state.model_loaded and state.current_model == "F5TTS_v1_Base") else "可用",
             "is_default": True
         }
     ]
@@ -173,69 +406,100 @@ async def simple_tts(
     model: str = Form(DEFAULT_MODEL, description="模型名称")
 ):
     """简化版文本转语音接口，使用预加载的模型进行快速推理"""
-    global f5tts_instance, model_loaded
-    
     try:
-        # 检查文件类型
-        if not ref_audio.content_type.startswith("audio/"):
-            raise HTTPException(status_code=400, detail="上传的文件不是音频格式")
+        # 根据文件头校验音频格式，不依赖客户端声明的Content-Type，在解码和推理之前尽早拒绝
+        header = await ref_audio.read(12)
+        if not _is_audio_header(header):
+            raise HTTPException(
+                status_code=415,
+                detail=f"上传的文件不是支持的音频格式，支持: {SUPPORTED_AUDIO_FORMATS}"
+            )
         
-        # 如果模型未加载，尝试加载
-        if not model_loaded or f5tts_instance is None:
-            print("🔄 模型未预加载，正在加载...")
-            get_f5tts_instance(model, DEFAULT_CKPT_FILE, DEFAULT_VOCAB_FILE)
+        # 启动时已预加载模型，此处仅作为预加载失败时的兜底
+        if not state.model_loaded or state.f5tts_instance is None:
+            logger.info("🔄 模型未预加载，正在加载...")
+            await get_f5tts_instance(model, DEFAULT_CKPT_FILE, DEFAULT_VOCAB_FILE)
         
-        # 保存上传的音频文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_ref:
-            content = await ref_audio.read()
-            temp_ref.write(content)
-            temp_ref_path = temp_ref.name
+        logger.info("🎯 开始推理...")
+        logger.info(f"📄 参考文本: {ref_text}")
+        logger.info(f"📝 生成文本: {gen_text}")
         
-        try:
-            # 创建输出文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_output:
-                output_path = temp_output.name
-            
-            print(f"🎯 开始推理...")
-            print(f"📄 参考文本: {ref_text}")
-            print(f"📝 生成文本: {gen_text}")
-            
-            # 使用预加载的模型进行推理
-            wav, sr, spec = f5tts_instance.infer(
-                ref_file=temp_ref_path,
-                ref_text=ref_text,
-                gen_text=gen_text,
-                file_wave=output_path
-            )
-            
-            print(f"✅ 推理完成，音频已生成")
-            
-            return FileResponse(
-                path=output_path,
-                media_type="audio/wav",
-                filename="generated_audio.wav"
-            )
-            
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_ref_path):
-                os.unlink(temp_ref_path)
+        # 提交到批处理队列，与同时到达的其他请求合并推理；
+        # 直接传入上传文件对象（Starlette的SpooledTemporaryFile），由预处理按块哈希；
+        # 新的参考音频会按块复制到临时文件后交给ffmpeg解码，编码后的上传内容不会整体读入内存
+        future = asyncio.get_running_loop().create_future()
+        await _request_queue.put(PendingRequest(future, ref_audio.file, ref_text, gen_text))
+        wav, sr, spec = await future
+        
+        logger.info("✅ 推理完成，音频已生成")
+        
+        # 生成的音频以16位PCM写入内存缓冲区返回，体积为float32 WAV的一半
+        wav_buffer = io.BytesIO()
+        sf.write(wav_buffer, wav, sr, format="WAV", subtype="PCM_16")
+        
+        return Response(
+            content=wav_buffer.getvalue(),
+            media_type="audio/wav",
+            headers={"Content-Disposition": 'attachment; filename="generated_audio.wav"'}
+        )
     
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ 推理失败: {e}")
+        logger.error(f"❌ 推理失败: {e}")
         raise HTTPException(status_code=500, detail=f"推理失败: {str(e)}")
 
 import uvicorn
 
+# 部署说明：每个worker进程都会加载一份完整的模型，不同worker之间无法共享显存中的权重。
+# 单GPU请只运行一个worker，由内置的微批处理合并并发请求，让一份模型副本保持满载，
+# 不要用多worker扩展并发，否则会按worker数成倍占用显存和加载时间。
+# 多GPU部署示例（每个GPU一个worker）：
+#   gunicorn f5_tts.fastapi_server:app -k uvicorn.workers.UvicornWorker -w <GPU数量> -b 0.0.0.0:8041
+# 需自行通过 CUDA_VISIBLE_DEVICES 等方式为各worker分配不同的GPU
+# 建议安装 uvicorn[standard]：uvicorn默认(loop/http为auto)会自动启用其中的uvloop和httptools
+
 if __name__ == "__main__":
-    print("🚀 启动F5-TTS FastAPI服务器...")
-    print("📍 默认模型: F5TTS_v1_Base")
-    print("📁 模型路径: models/F5-TTS/F5TTS_v1_Base/model_1250000.safetensors")
-    print("🌐 服务器地址: http://localhost:8000")
-    print("📖 API文档: http://localhost:8000/docs")
-    print("💡 使用 POST /preload 预加载模型")
-    print("🛑 按 Ctrl+C 停止服务器")
-    print("-" * 50)
+    parser = argparse.ArgumentParser(description="F5-TTS FastAPI服务器")
+    parser.add_argument(
+        "--precision",
+        choices=PRECISION_CHOICES,
+        default=PRECISION,
+        help="模型推理精度，也可通过环境变量 F5TTS_PRECISION 设置",
+    )
+    parser.add_argument(
+        "--compile-mode",
+        choices=COMPILE_MODE_CHOICES,
+        default=COMPILE_MODE,
+        help="torch.compile编译模式，也可通过环境变量 F5TTS_COMPILE_MODE 设置；"
+        "reduce-overhead会为每种输入长度录制CUDA Graph，适合生成长度较固定的场景",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help="单批最多合并推理的请求数，也可通过环境变量 F5TTS_MAX_BATCH_SIZE 设置",
+    )
+    parser.add_argument(
+        "--max-batch-samples",
+        type=int,
+        default=MAX_BATCH_SAMPLES,
+        help="单次采样最多并行的样本数（长文本会切分为多个样本），也可通过环境变量 F5TTS_MAX_BATCH_SAMPLES 设置",
+    )
+    args = parser.parse_args()
+    PRECISION = args.precision
+    COMPILE_MODE = args.compile_mode
+    MAX_BATCH_SIZE = args.max_batch_size
+    MAX_BATCH_SAMPLES = args.max_batch_samples
+    
+    logger.info("🚀 启动F5-TTS FastAPI服务器...")
+    logger.info("📍 默认模型: F5TTS_v1_Base")
+    logger.info("📁 模型路径: models/F5-TTS/F5TTS_v1_Base/model_1250000.safetensors")
+    logger.info("🌐 服务器地址: http://localhost:8000")
+    logger.info("📖 API文档: http://localhost:8000/docs")
+    logger.info("💡 启动时自动预加载模型；若预加载失败，可使用 POST /preload 重试（模型已加载时该接口不会重新加载）")
+    logger.info("🛑 按 Ctrl+C 停止服务器")
+    logger.info("-" * 50)
     
     uvicorn.run(
         app,
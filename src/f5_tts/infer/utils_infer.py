@@ -2,7 +2,9 @@
 # Make adjustments inside functions, and consider both gradio and cli scripts if need to change func output format
 import os
 import sys
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 
 os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"  # for MPS device compatibility
@@ -10,6 +12,7 @@ sys.path.append(f"{os.path.dirname(os.path.abspath(__file__))}/../../third_party
 
 import hashlib
 import re
+import shutil
 import tempfile
 from importlib.resources import files
 
@@ -25,6 +28,7 @@ import torchaudio
 import tqdm
 from huggingface_hub import hf_hub_download
 from pydub import AudioSegment, silence
+from torch.nn.utils.rnn import pad_sequence
 from transformers import pipeline
 from vocos import Vocos
 
@@ -32,7 +36,10 @@ from f5_tts.model import CFM
 from f5_tts.model.utils import convert_char_to_pinyin, get_tokenizer
 
 
-_ref_audio_cache = {}
+_ref_audio_cache = OrderedDict()
+_ref_audio_cache_size = 64  # max number of preprocessed reference clips kept on disk
+_ref_wave_cache = {}  # preprocessed clip path -> decoded (audio, sr), filled on first use
+_ref_mel_cache = {}  # preprocessed clip path -> {(target_rms, mel_spec_type, device): (ref_mel, rms)}
 _ref_text_cache = {}
 
 device = (
@@ -242,6 +249,7 @@ def load_model(
     ode_method=ode_method,
     use_ema=True,
     device=device,
+    dtype=None,
 ):
     if vocab_file == "":
         vocab_file = str(files("f5_tts").joinpath("infer/examples/vocab.txt"))
@@ -268,7 +276,8 @@ def load_model(
         vocab_char_map=vocab_char_map,
     ).to(device)
 
-    dtype = torch.float32 if mel_spec_type == "bigvgan" else None
+    if dtype is None and mel_spec_type == "bigvgan":
+        dtype = torch.float32
     model = load_checkpoint(model, ckpt_path, device, dtype=dtype, use_ema=use_ema)
 
     return model
@@ -296,22 +305,40 @@ def remove_silence_edges(audio, silence_threshold=-42):
 def preprocess_ref_audio_text(ref_audio_orig, ref_text, show_info=print):
     show_info("Converting audio...")
 
-    # Compute a hash of the reference audio file
-    with open(ref_audio_orig, "rb") as audio_file:
-        audio_data = audio_file.read()
-        audio_hash = hashlib.md5(audio_data).hexdigest()
+    # Compute a hash of the reference audio, either a file path or a binary file-like object,
+    # read in chunks so that large uploads are never fully buffered just for hashing
+    audio_hasher = hashlib.blake2b(digest_size=16)
+    if isinstance(ref_audio_orig, (str, os.PathLike)):
+        with open(ref_audio_orig, "rb") as audio_file:
+            while chunk := audio_file.read(1 << 16):
+                audio_hasher.update(chunk)
+    else:
+        while chunk := ref_audio_orig.read(1 << 16):
+            audio_hasher.update(chunk)
+        ref_audio_orig.seek(0)
+    audio_hash = audio_hasher.hexdigest()
 
     global _ref_audio_cache
 
     if audio_hash in _ref_audio_cache:
         show_info("Using cached preprocessed reference audio...")
+        _ref_audio_cache.move_to_end(audio_hash)
         ref_audio = _ref_audio_cache[audio_hash]
 
     else:  # first pass, do preprocess
         with tempfile.NamedTemporaryFile(suffix=".wav", **tempfile_kwargs) as f:
             temp_path = f.name
 
-        aseg = AudioSegment.from_file(ref_audio_orig)
+        if isinstance(ref_audio_orig, (str, os.PathLike)):
+            aseg = AudioSegment.from_file(ref_audio_orig)
+        else:
+            # pydub reads a file object whole to pipe it into ffmpeg, so copy it to disk in chunks and pass a path
+            with tempfile.TemporaryDirectory() as upload_dir:
+                upload_path = os.path.join(upload_dir, "ref_audio")
+                with open(upload_path, "wb") as upload_file:
+                    shutil.copyfileobj(ref_audio_orig, upload_file, 1 << 16)
+                ref_audio_orig.seek(0)
+                aseg = AudioSegment.from_file(upload_path)
 
         # 1. try to find long silence for clipping
         non_silent_segs = silence.split_on_silence(
@@ -347,8 +374,16 @@ def preprocess_ref_audio_text(ref_audio_orig, ref_text, show_info=print):
         aseg.export(temp_path, format="wav")
         ref_audio = temp_path
 
-        # Cache the processed reference audio
+        # Cache the processed reference audio, dropping the temp files of least recently used entries
         _ref_audio_cache[audio_hash] = ref_audio
+        _ref_wave_cache[ref_audio] = None
+        _ref_mel_cache[ref_audio] = {}
+        while len(_ref_audio_cache) > _ref_audio_cache_size:
+            _, evicted_path = _ref_audio_cache.popitem(last=False)
+            _ref_wave_cache.pop(evicted_path, None)
+            _ref_mel_cache.pop(evicted_path, None)
+            if os.path.exists(evicted_path):
+                os.unlink(evicted_path)
 
     if not ref_text.strip():
         global _ref_text_cache
@@ -376,6 +411,110 @@ def preprocess_ref_audio_text(ref_audio_orig, ref_text, show_info=print):
     return ref_audio, ref_text
 
 
+# load reference audio, reusing the decoded waveform of preprocessed clips (they never change)
+
+
+def load_ref_audio(ref_audio):
+    ref_wave = _ref_wave_cache.get(ref_audio)
+    if ref_wave is None:
+        ref_wave = torchaudio.load(ref_audio)
+        if ref_audio in _ref_wave_cache:
+            _ref_wave_cache[ref_audio] = ref_wave
+    return ref_wave
+
+
+# get normalized, resampled reference mel (n d) of a preprocessed clip, computed once per clip and setting
+
+
+def get_ref_mel(ref_audio, model_obj, mel_spec_type=mel_spec_type, target_rms=target_rms, device=device):
+    key = (target_rms, mel_spec_type, str(device))
+    ref_mels = _ref_mel_cache.get(ref_audio)
+    if ref_mels is not None and key in ref_mels:
+        return ref_mels[key]
+
+    audio, sr = load_ref_audio(ref_audio)
+    audio, rms = prepare_ref_audio(audio, sr, target_rms=target_rms)
+    with torch.inference_mode():
+        ref_mel = model_obj.mel_spec(audio.to(device))[0].permute(1, 0)
+
+    if ref_mels is not None:
+        ref_mels[key] = (ref_mel, rms)
+    return ref_mel, rms
+
+
+# get resampler to target sample rate, cached as building the resampling kernel costs more than applying it
+
+
+@lru_cache(maxsize=None)
+def get_resampler(orig_freq, new_freq=target_sample_rate):
+    return torchaudio.transforms.Resample(orig_freq, new_freq)
+
+
+# prepare reference audio: mix to mono, boost quiet clips to target_rms, resample to target_sample_rate
+
+
+def prepare_ref_audio(audio, sr, target_rms=target_rms):
+    if audio.shape[0] > 1:
+        audio = torch.mean(audio, dim=0, keepdim=True)
+
+    rms = torch.sqrt(torch.mean(torch.square(audio)))
+    if rms < target_rms:
+        audio = audio * target_rms / rms
+    if sr != target_sample_rate:
+        resampler = get_resampler(sr)
+        audio = resampler(audio)
+
+    return audio, rms
+
+
+# prepare reference text: a trailing space keeps single-byte (e.g. latin) text apart from gen_text
+
+
+def prepare_ref_text(ref_text):
+    if len(ref_text[-1].encode("utf-8")) == 1:
+        ref_text = ref_text + " "
+    return ref_text
+
+
+# split gen_text into batches sized by the reference speaking rate
+
+
+def split_gen_text(ref_text, gen_text, ref_audio_duration, speed=speed):
+    max_chars = int(len(ref_text.encode("utf-8")) / ref_audio_duration * (22 - ref_audio_duration) * speed)
+    return chunk_text(gen_text, max_chars=max_chars)
+
+
+# estimate total mel frames (reference + generated) from the reference speaking rate
+
+
+def estimate_duration(ref_audio_len, ref_text, gen_text, speed=speed, fix_duration=None):
+    if fix_duration is not None:
+        return int(fix_duration * target_sample_rate / hop_length)
+
+    local_speed = speed
+    if len(gen_text.encode("utf-8")) < 10:
+        local_speed = 0.3
+
+    ref_text_len = len(ref_text.encode("utf-8"))
+    gen_text_len = len(gen_text.encode("utf-8"))
+    return ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / local_speed)
+
+
+# vocode generated mel (b d n, float32) to a numpy wave, undoing the loudness boost of quiet references
+
+
+def vocode_mel(generated, vocoder, ref_rms, mel_spec_type=mel_spec_type, target_rms=target_rms):
+    if mel_spec_type == "vocos":
+        generated_wave = vocoder.decode(generated)
+    elif mel_spec_type == "bigvgan":
+        generated_wave = vocoder(generated)
+    if ref_rms < target_rms:
+        generated_wave = generated_wave * ref_rms / target_rms
+
+    # wav -> numpy
+    return generated_wave.squeeze().cpu().numpy()
+
+
 # infer process: chunk text -> infer batches [i.e. infer_batch_process()]
 
 
@@ -397,10 +536,10 @@ def infer_process(
     fix_duration=fix_duration,
     device=device,
 ):
+    audio, sr = load_ref_audio(ref_audio)
+
     # Split the input text into batches
-    audio, sr = torchaudio.load(ref_audio)
-    max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (22 - audio.shape[-1] / sr) * speed)
-    gen_text_batches = chunk_text(gen_text, max_chars=max_chars)
+    gen_text_batches = split_gen_text(ref_text, gen_text, audio.shape[-1] / sr, speed=speed)
     for i, gen_text in enumerate(gen_text_batches):
         print(f"gen_text {i}", gen_text)
     print("\n")
@@ -450,40 +589,22 @@ def infer_batch_process(
     chunk_size=2048,
 ):
     audio, sr = ref_audio
-    if audio.shape[0] > 1:
-        audio = torch.mean(audio, dim=0, keepdim=True)
-
-    rms = torch.sqrt(torch.mean(torch.square(audio)))
-    if rms < target_rms:
-        audio = audio * target_rms / rms
-    if sr != target_sample_rate:
-        resampler = torchaudio.transforms.Resample(sr, target_sample_rate)
-        audio = resampler(audio)
+    audio, rms = prepare_ref_audio(audio, sr, target_rms=target_rms)
     audio = audio.to(device)
 
     generated_waves = []
     spectrograms = []
 
-    if len(ref_text[-1].encode("utf-8")) == 1:
-        ref_text = ref_text + " "
+    ref_text = prepare_ref_text(ref_text)
 
     def process_batch(gen_text):
-        local_speed = speed
-        if len(gen_text.encode("utf-8")) < 10:
-            local_speed = 0.3
-
         # Prepare the text
         text_list = [ref_text + gen_text]
         final_text_list = convert_char_to_pinyin(text_list)
 
+        # Calculate duration
         ref_audio_len = audio.shape[-1] // hop_length
-        if fix_duration is not None:
-            duration = int(fix_duration * target_sample_rate / hop_length)
-        else:
-            # Calculate duration
-            ref_text_len = len(ref_text.encode("utf-8"))
-            gen_text_len = len(gen_text.encode("utf-8"))
-            duration = ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / local_speed)
+        duration = estimate_duration(ref_audio_len, ref_text, gen_text, speed=speed, fix_duration=fix_duration)
 
         # inference
         with torch.inference_mode():
@@ -500,15 +621,7 @@ def infer_batch_process(
             generated = generated.to(torch.float32)  # generated mel spectrogram
             generated = generated[:, ref_audio_len:, :]
             generated = generated.permute(0, 2, 1)
-            if mel_spec_type == "vocos":
-                generated_wave = vocoder.decode(generated)
-            elif mel_spec_type == "bigvgan":
-                generated_wave = vocoder(generated)
-            if rms < target_rms:
-                generated_wave = generated_wave * rms / target_rms
-
-            # wav -> numpy
-            generated_wave = generated_wave.squeeze().cpu().numpy()
+            generated_wave = vocode_mel(generated, vocoder, rms, mel_spec_type=mel_spec_type, target_rms=target_rms)
 
             if streaming:
                 for j in range(0, len(generated_wave), chunk_size):
@@ -533,50 +646,151 @@ def infer_batch_process(
                     spectrograms.append(generated_mel_spec)
 
         if generated_waves:
-            if cross_fade_duration <= 0:
-                # Simply concatenate
-                final_wave = np.concatenate(generated_waves)
-            else:
-                # Combine all generated waves with cross-fading
-                final_wave = generated_waves[0]
-                for i in range(1, len(generated_waves)):
-                    prev_wave = final_wave
-                    next_wave = generated_waves[i]
+            final_wave = cross_fade_waves(generated_waves, cross_fade_duration)
+
+            # Create a combined spectrogram
+            combined_spectrogram = np.concatenate(spectrograms, axis=1)
 
-                    # Calculate cross-fade samples, ensuring it does not exceed wave lengths
-                    cross_fade_samples = int(cross_fade_duration * target_sample_rate)
-                    cross_fade_samples = min(cross_fade_samples, len(prev_wave), len(next_wave))
+            yield final_wave, target_sample_rate, combined_spectrogram
 
-                    if cross_fade_samples <= 0:
-                        # No overlap possible, concatenate
-                        final_wave = np.concatenate([prev_wave, next_wave])
-                        continue
+        else:
+            yield None, target_sample_rate, None
 
-                    # Overlapping parts
-                    prev_overlap = prev_wave[-cross_fade_samples:]
-                    next_overlap = next_wave[:cross_fade_samples]
 
-                    # Fade out and fade in
-                    fade_out = np.linspace(1, 0, cross_fade_samples)
-                    fade_in = np.linspace(0, 1, cross_fade_samples)
+# infer multiple requests, each with its own reference, in one shared sampling batch
 
-                    # Cross-faded overlap
-                    cross_faded_overlap = prev_overlap * fade_out + next_overlap * fade_in
 
-                    # Combine
-                    new_wave = np.concatenate(
-                        [prev_wave[:-cross_fade_samples], cross_faded_overlap, next_wave[cross_fade_samples:]]
-                    )
+def infer_multi_process(
+    requests,
+    model_obj,
+    vocoder,
+    mel_spec_type=mel_spec_type,
+    show_info=print,
+    target_rms=target_rms,
+    cross_fade_duration=cross_fade_duration,
+    nfe_step=nfe_step,
+    cfg_strength=cfg_strength,
+    sway_sampling_coef=sway_sampling_coef,
+    speed=speed,
+    device=device,
+    max_batch_samples=None,
+):
+    # requests: list of (ref_audio, ref_text, gen_text), with ref_audio and ref_text already preprocessed
+    # max_batch_samples: cap on text batches sampled together, the overflow is sampled in following batches
+    ref_mels, text_list, ref_mel_lens, durations, ref_rms_list, owners = [], [], [], [], [], []
+    for idx, (ref_audio, ref_text, gen_text) in enumerate(requests):
+        audio, sr = load_ref_audio(ref_audio)
+        gen_text_batches = split_gen_text(ref_text, gen_text, audio.shape[-1] / sr, speed=speed)
+
+        # Pass the cached reference mel as cond, as eval does, so CFM.sample() skips mel extraction
+        ref_mel, rms = get_ref_mel(ref_audio, model_obj, mel_spec_type, target_rms=target_rms, device=device)
+        ref_mel_len = ref_mel.shape[0]
+        ref_text = prepare_ref_text(ref_text)
+
+        # Every text batch of every request becomes one sample of the sampling batch
+        for gen_text in gen_text_batches:
+            text = convert_char_to_pinyin([ref_text + gen_text])[0]
+            duration = estimate_duration(ref_mel_len, ref_text, gen_text, speed=speed)
+            # CFM.sample() lengthens duration to fit text and reference, mirror it to slice out each sample
+            duration = min(max(max(len(text), ref_mel_len) + 1, duration), 4096)
+
+            ref_mels.append(ref_mel)
+            text_list.append(text)
+            ref_mel_lens.append(ref_mel_len)
+            durations.append(duration)
+            ref_rms_list.append(rms)
+            owners.append(idx)
+
+    # Group samples of similar duration, as eval buckets by length, so padding to the longest stays small
+    assert max_batch_samples is None or max_batch_samples >= 1
+    order = sorted(range(len(text_list)), key=lambda i: durations[i])
+    batch_samples = max_batch_samples if max_batch_samples is not None else len(order)
+    sample_waves = [None] * len(order)
+    sample_specs = [None] * len(order)
+
+    # inference
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_samples):
+            group = order[start : start + batch_samples]
+            show_info(
+                f"Generating audio for {len(requests)} requests, samples {start + 1}-{start + len(group)} of {len(order)}..."
+            )
 
-                    final_wave = new_wave
+            generated, _ = model_obj.sample(
+                cond=pad_sequence([ref_mels[i] for i in group], batch_first=True),
+                text=[text_list[i] for i in group],
+                duration=torch.tensor([durations[i] for i in group], dtype=torch.long, device=device),
+                lens=torch.tensor([ref_mel_lens[i] for i in group], dtype=torch.long, device=device),
+                steps=nfe_step,
+                cfg_strength=cfg_strength,
+                sway_sampling_coef=sway_sampling_coef,
+            )
+            del _
 
-            # Create a combined spectrogram
-            combined_spectrogram = np.concatenate(spectrograms, axis=1)
+            generated = generated.to(torch.float32)  # generated mel spectrograms
+            for i, gen in zip(group, generated):
+                gen = gen[ref_mel_lens[i] : durations[i], :].unsqueeze(0)
+                gen = gen.permute(0, 2, 1)
+                sample_waves[i] = vocode_mel(
+                    gen, vocoder, ref_rms_list[i], mel_spec_type=mel_spec_type, target_rms=target_rms
+                )
+                sample_specs[i] = gen[0].cpu().numpy()
+
+    # Regroup samples by request, keeping the text batch order
+    generated_waves = [[] for _ in requests]
+    spectrograms = [[] for _ in requests]
+    for i, owner in enumerate(owners):
+        generated_waves[owner].append(sample_waves[i])
+        spectrograms[owner].append(sample_specs[i])
+
+    return [
+        (cross_fade_waves(waves, cross_fade_duration), target_sample_rate, np.concatenate(specs, axis=1))
+        for waves, specs in zip(generated_waves, spectrograms)
+    ]
+
+
+# combine generated waves of consecutive text batches
+
+
+def cross_fade_waves(generated_waves, cross_fade_duration=0.15):
+    if cross_fade_duration <= 0:
+        # Simply concatenate
+        return np.concatenate(generated_waves)
+
+    # Combine all generated waves with cross-fading
+    final_wave = generated_waves[0]
+    for i in range(1, len(generated_waves)):
+        prev_wave = final_wave
+        next_wave = generated_waves[i]
+
+        # Calculate cross-fade samples, ensuring it does not exceed wave lengths
+        cross_fade_samples = int(cross_fade_duration * target_sample_rate)
+        cross_fade_samples = min(cross_fade_samples, len(prev_wave), len(next_wave))
+
+        if cross_fade_samples <= 0:
+            # No overlap possible, concatenate
+            final_wave = np.concatenate([prev_wave, next_wave])
+            continue
+
+        # Overlapping parts
+        prev_overlap = prev_wave[-cross_fade_samples:]
+        next_overlap = next_wave[:cross_fade_samples]
+
+        # Fade out and fade in
+        fade_out = np.linspace(1, 0, cross_fade_samples)
+        fade_in = np.linspace(0, 1, cross_fade_samples)
+
+        # Cross-faded overlap
+        cross_faded_overlap = prev_overlap * fade_out + next_overlap * fade_in
+
+        # Combine
+        new_wave = np.concatenate(
+            [prev_wave[:-cross_fade_samples], cross_faded_overlap, next_wave[cross_fade_samples:]]
+        )
 
-            yield final_wave, target_sample_rate, combined_spectrogram
+        final_wave = new_wave
 
-        else:
-            yield None, target_sample_rate, None
+    return final_wave
 
 
 # remove silence from generated wav
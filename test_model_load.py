@@ -74,9 +74,10 @@ def test_model_load():
         else:
             print("! CUDA不可用，将使用CPU")
         
-        # 尝试加载safetensors文件
+        # 尝试加载safetensors文件，有GPU时直接加载到显存，省去CPU中转
         from safetensors import safe_open
-        with safe_open(MODEL_FILE, framework="pt", device="cpu") as f:
+        load_device = "cuda:0" if torch.cuda.is_available() else "cpu"
+        with safe_open(MODEL_FILE, framework="pt", device=load_device) as f:
             keys = list(f.keys())
             print(f"✓ 成功读取模型文件")
             print(f"  模型参数数量: {len(keys)}")